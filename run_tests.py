@@ -4,15 +4,27 @@ Automated Testing Script for CSV Email Tool
 Runs comprehensive tests and generates a report
 """
 
-import subprocess
+import argparse
+import io
+import mmap
+import re
 import sys
+from contextlib import redirect_stdout, redirect_stderr
+from functools import lru_cache
 from pathlib import Path
 import email
 from email import policy
+from email.parser import BytesParser
 from colorama import init, Fore, Style
 
 init(autoreset=True)
 
+# Attachment filenames in (possibly folded) Content-Disposition headers
+FILENAME_RE = re.compile(
+    rb'^Content-Disposition:[^\n]*(?:\n[ \t][^\n]*)*?\bfilename="?([^";\r\n]+)"?',
+    re.IGNORECASE | re.MULTILINE
+)
+
 def print_header(text):
     """Print section header"""
     print(f"\n{Fore.CYAN}{'='*70}")
@@ -31,20 +43,29 @@ def print_info(text):
     """Print info message"""
     print(f"{Fore.YELLOW}ℹ {text}{Style.RESET_ALL}")
 
-def run_command(cmd, description):
-    """Run a command and return success status"""
+def run_tool(args, description):
+    """Run the email tool in-process and return success status"""
     print(f"\n{Fore.CYAN}Running: {description}{Style.RESET_ALL}")
-    print(f"Command: {' '.join(cmd)}")
+    print(f"Command: python -m src.main {' '.join(args)}")
 
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    output = io.StringIO()
+    try:
+        with redirect_stdout(output), redirect_stderr(output):
+            from src.main import main as tool_main
+            exit_code = tool_main(args)
+    except SystemExit as e:
+        exit_code = e.code
+    except Exception as e:
+        output.write(str(e))
+        exit_code = 1
 
-    if result.returncode == 0:
+    if exit_code == 0:
         print_success(f"{description} completed successfully")
         return True
     else:
         print_error(f"{description} failed")
-        if result.stderr:
-            print(f"Error: {result.stderr}")
+        if output.getvalue():
+            print(f"Error: {output.getvalue()}")
         return False
 
 def check_file_exists(filepath, description):
@@ -56,32 +77,106 @@ def check_file_exists(filepath, description):
         print_error(f"{description} not found: {filepath}")
         return False
 
-def analyze_email(eml_path):
+def parse_csv_file(csv_path):
+    """Parse a CSV file the way the tool does"""
+    from src.main import load_config
+    from src.csv_parser import CSVParser
+    return CSVParser(load_config('config/config.yaml')).parse_csv(csv_path)
+
+def attached_contents_after_edit():
+    """Generate an email, edit its attachment, generate it again and return both attachments"""
+    import tempfile
+    from src.main import load_config
+    from src.email_generator import EmailGenerator
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config = load_config('config/config.yaml')
+        config['paths']['output'] = tmp
+        config['paths']['attachment_base'] = tmp
+        config['email']['format'] = 'eml'
+        generator = EmailGenerator(config)
+
+        attachment = Path(tmp) / 'statement.txt'
+        email_data = {'to': 'a@example.com', 'entity_name': 'ACME', 'invoice_number': '1',
+                      'attachments': ['statement.txt']}
+
+        contents = []
+        for text in ('first version', 'second version, longer'):
+            attachment.write_text(text)
+            msg, _ = parse_email_full(generator.generate_email(email_data))
+            contents.extend(
+                part.get_payload(decode=True).decode() for part in msg.walk() if part.get_filename() == 'statement.txt'
+            )
+
+    return contents
+
+def analyze_email(eml_path, deep=False):
     """Analyze an email file and return details"""
     try:
-        with open(eml_path, 'rb') as f:
-            msg = email.message_from_binary_file(f, policy=policy.default)
-
-        attachments = []
-        for part in msg.walk():
-            filename = part.get_filename()
-            if filename:
-                attachments.append(filename)
-
-        return {
-            'from': msg['From'],
-            'to': msg['To'],
-            'cc': msg.get('Cc', ''),
-            'bcc': msg.get('Bcc', ''),
-            'subject': msg['Subject'],
-            'attachments': attachments
-        }
+        stat = Path(eml_path).stat()
+        return analyze_email_cached(str(eml_path), stat.st_mtime_ns, stat.st_size, deep)
     except Exception as e:
         print_error(f"Error analyzing {eml_path}: {str(e)}")
         return None
 
+@lru_cache(maxsize=256)
+def analyze_email_cached(eml_path, mtime_ns, size, deep):
+    """Analyze an email file; repeat calls for an unchanged file hit the cache"""
+    if deep:
+        msg, attachments = parse_email_full(eml_path)
+    else:
+        msg, attachments = parse_email_headers(eml_path)
+
+    return {
+        'from': msg['From'],
+        'to': msg['To'],
+        'cc': msg.get('Cc', ''),
+        'bcc': msg.get('Bcc', ''),
+        'subject': msg['Subject'],
+        'attachments': attachments
+    }
+
+def parse_email_full(eml_path):
+    """Parse the whole message, walking every MIME part"""
+    with open(eml_path, 'rb') as f:
+        msg = email.message_from_binary_file(f, policy=policy.default)
+
+    attachments = []
+    for part in msg.walk():
+        filename = part.get_filename()
+        if filename:
+            attachments.append(filename)
+
+    return msg, attachments
+
+def parse_email_headers(eml_path):
+    """Parse top-level headers only and scan for attachment filenames"""
+    with open(eml_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # Top-level headers end at the first blank line
+        end = mm.find(b'\n\n')
+        crlf_end = mm.find(b'\r\n\r\n')
+        if crlf_end != -1 and (end == -1 or crlf_end < end):
+            end = crlf_end
+        headers = mm[:end] if end != -1 else mm[:]
+
+        msg = BytesParser(policy=policy.default).parsebytes(headers, headersonly=True)
+        attachments = [
+            name.decode('utf-8', 'replace').strip()
+            for name in FILENAME_RE.findall(mm)
+        ]
+
+    return msg, attachments
+
 def main():
     """Run all tests"""
+    arg_parser = argparse.ArgumentParser(description='Run CSV Email Tool tests')
+    arg_parser.add_argument(
+        '--deep',
+        action='store_true',
+        help='Fully parse generated emails instead of reading headers only'
+    )
+    args = arg_parser.parse_args()
+
     print_header("CSV Email Tool - Automated Testing")
 
     passed = 0
@@ -129,8 +224,7 @@ def main():
         print_info("Cleaned output directory")
 
     # Run the tool
-    cmd = [sys.executable, '-m', 'src.main', 'tests/sample_data.csv', '--skip-validation']
-    if run_command(cmd, "Generate emails"):
+    if run_tool(['tests/sample_data.csv', '--skip-validation'], "Generate emails"):
         passed += 1
     else:
         failed += 1
@@ -159,7 +253,7 @@ def main():
         sample_email = output_files[0]
         print_info(f"Analyzing: {sample_email.name}")
 
-        details = analyze_email(sample_email)
+        details = analyze_email(sample_email, args.deep)
         if details:
             print(f"\n{Fore.CYAN}Email Details:{Style.RESET_ALL}")
             print(f"  From:    {details['from']}")
@@ -202,7 +296,7 @@ def main():
         # Analyze first group email
         group_email = group_emails[0]
         print_info(f"Analyzing grouped email: {group_email.name}")
-        details = analyze_email(group_email)
+        details = analyze_email(group_email, args.deep)
         if details:
             print(f"  Subject: {details['subject']}")
             if 'Invoices' in details['subject']:
@@ -220,7 +314,7 @@ def main():
 
     emails_with_attachments = 0
     for eml_file in output_files[:3]:  # Check first 3 emails
-        details = analyze_email(eml_file)
+        details = analyze_email(eml_file, args.deep)
         if details and details['attachments']:
             emails_with_attachments += 1
             print_success(f"{eml_file.name}: {len(details['attachments'])} attachment(s)")
@@ -232,6 +326,45 @@ def main():
         print_error("No emails have attachments")
         failed += 1
 
+    # Test 8: CSV parsing regressions
+    print_header("Test 8: CSV Parsing Regressions")
+
+    regression_checks = [
+        ('tests/regression_duplicate_headers.csv', 'Notes.1', ['second note', 'another note']),
+        ('tests/regression_timestamps.csv', 'Due Date', ['2026-03-01T09:30:00', '', '2026-03-02T17:45:00']),
+        ('tests/regression_times.csv', 'Due Date', ['10:30', '14:05']),
+        ('tests/regression_blank_dates.csv', 'Due Date', ['2026-03-01', '']),
+    ]
+
+    for csv_path, column, expected in regression_checks:
+        try:
+            values = parse_csv_file(csv_path)[column].tolist()
+        except Exception as e:
+            values = f"error: {e}"
+
+        if values == expected:
+            print_success(f"{csv_path}: '{column}' read as {expected}")
+            passed += 1
+        else:
+            print_error(f"{csv_path}: '{column}' read as {values}, expected {expected}")
+            failed += 1
+
+    # Test 9: Attachments re-read when generating emails one at a time
+    print_header("Test 9: Edited Attachment Regression")
+
+    try:
+        contents = attached_contents_after_edit()
+    except Exception as e:
+        contents = f"error: {e}"
+
+    expected = ['first version', 'second version, longer']
+    if contents == expected:
+        print_success("Edited attachment is attached with its new content")
+        passed += 1
+    else:
+        print_error(f"Attached contents were {contents}, expected {expected}")
+        failed += 1
+
     # Print summary
     print_summary(passed, failed)
 
@@ -4,13 +4,20 @@ Handles reading and validating CSV files for email generation.
 """
 
 import pandas as pd
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Set
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Separators between multiple addresses in one cell
+_SPLIT_RE = re.compile(r'[;,]')
+
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
 
 class CSVParser:
     """Parses and validates CSV files for email generation."""
@@ -26,6 +33,9 @@ class CSVParser:
         self.csv_columns = config.get('csv_columns', {})
         self.validation = config.get('validation', {})
 
+        # Attachment paths confirmed to exist by the last validate_attachments()
+        self.verified_attachments: Set[Path] = set()
+
     def parse_csv(self, csv_path: str) -> pd.DataFrame:
         """
         Parse CSV file and return DataFrame.
@@ -48,7 +58,7 @@ class CSVParser:
         logger.info(f"Reading CSV file: {csv_path}")
 
         try:
-            df = pd.read_csv(csv_path)
+            df = self._read_csv(csv_path)
         except Exception as e:
             raise ValueError(f"Error reading CSV file: {str(e)}")
 
@@ -62,6 +72,72 @@ class CSVParser:
 
         return df
 
+    @staticmethod
+    def _read_csv(csv_path: str) -> pd.DataFrame:
+        """
+        Read CSV file into a DataFrame using the fastest available engine.
+
+        The multi-threaded pyarrow engine is used when pyarrow is installed
+        and its result matches what the C engine would produce. Files it
+        reads differently (see _pyarrow_mismatch), files it rejects (ragged
+        rows the C engine tolerates) and installs without pyarrow are read
+        with the C engine instead.
+
+        Args:
+            csv_path: Path to CSV file
+
+        Returns:
+            Raw DataFrame
+        """
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            pass
+        else:
+            try:
+                df = pd.read_csv(csv_path, engine='pyarrow')
+            except pd.errors.ParserError as e:
+                logger.debug(f"pyarrow CSV engine failed, using C engine: {str(e)}")
+            else:
+                mismatch = CSVParser._pyarrow_mismatch(df)
+                if mismatch is None:
+                    return df
+                logger.debug(f"pyarrow CSV engine {mismatch}, using C engine")
+
+        return pd.read_csv(csv_path, engine='c', low_memory=False)
+
+    @staticmethod
+    def _pyarrow_mismatch(df: pd.DataFrame) -> Optional[str]:
+        """
+        Check a pyarrow-read DataFrame for data the C engine reads differently.
+
+        pyarrow keeps duplicate column names instead of renaming them
+        ('Notes', 'Notes.1'), converts date, time and timestamp text to
+        temporal values (reformatting them and turning blanks into NaT),
+        and loads text that is not valid UTF-8 as raw bytes instead of
+        reporting an encoding error.
+
+        Args:
+            df: DataFrame read with the pyarrow engine
+
+        Returns:
+            Description of the first difference found, or None if there is none
+        """
+        if not df.columns.is_unique:
+            return "read duplicate column names"
+
+        for col, dtype in df.dtypes.items():
+            if pd.api.types.is_datetime64_any_dtype(dtype):
+                return f"inferred timestamps in {col}"
+            if dtype == object:
+                inferred = pd.api.types.infer_dtype(df[col], skipna=True)
+                if inferred in ('date', 'time', 'datetime'):
+                    return f"inferred dates or times in {col}"
+                if inferred == 'bytes':
+                    return f"read non-UTF-8 text in {col}"
+
+        return None
+
     def _validate_columns(self, df: pd.DataFrame) -> None:
         """
         Validate that required columns exist in DataFrame.
@@ -98,14 +174,26 @@ class CSVParser:
         Returns:
             Cleaned DataFrame
         """
-        # Strip whitespace from string columns
-        for col in df.columns:
-            if df[col].dtype == 'object':
-                df[col] = df[col].astype(str).str.strip()
+        # Columns are cleaned one at a time so only a single column's
+        # temporaries are alive at once
+        text_cols = df.select_dtypes(include=['object', 'string']).columns
+
+        for col in text_cols:
+            values = df[col]
+            missing = values.isna()
 
-        # Replace 'nan' strings with empty strings
-        df = df.replace('nan', '')
-        df = df.fillna('')
+            # Mixed object columns need converting; string dtypes don't
+            if values.dtype == object:
+                values = values.astype(str)
+
+            # Strip whitespace, then blank out missing values and 'nan' strings
+            values = values.str.strip()
+            df[col] = values.mask(missing | (values == 'nan'), '')
+
+        # Remaining missing values (e.g. empty numeric cells)
+        for col in df.columns.difference(text_cols):
+            if df[col].hasnans:
+                df[col] = df[col].fillna('')
 
         return df
 
@@ -122,40 +210,52 @@ class CSVParser:
         if not self.validation.get('validate_emails', True):
             return []
 
-        errors = []
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-
-        for idx, row in df.iterrows():
-            # Validate To addresses
-            to_col = self.csv_columns.get('to')
-            if to_col and row.get(to_col):
-                to_emails = self._split_emails(row[to_col])
-                for email in to_emails:
-                    if email and not re.match(email_pattern, email):
-                        errors.append(f"Row {idx + 2}: Invalid To email: {email}")
-
-            # Validate CC addresses
-            cc_col = self.csv_columns.get('cc')
-            if cc_col and row.get(cc_col):
-                cc_emails = self._split_emails(row[cc_col])
-                for email in cc_emails:
-                    if email and not re.match(email_pattern, email):
-                        errors.append(f"Row {idx + 2}: Invalid CC email: {email}")
-
-            # Validate BCC addresses
-            bcc_col = self.csv_columns.get('bcc')
-            if bcc_col and row.get(bcc_col):
-                bcc_emails = self._split_emails(row[bcc_col])
-                for email in bcc_emails:
-                    if email and not re.match(email_pattern, email):
-                        errors.append(f"Row {idx + 2}: Invalid BCC email: {email}")
+        invalid_parts = []
+        fields = (('to', 'To'), ('cc', 'CC'), ('bcc', 'BCC'))
 
-        return errors
+        for order, (field, label) in enumerate(fields):
+            col = self.csv_columns.get(field)
+            if not col or col not in df.columns:
+                continue
+
+            # One entry per address, indexed by row position
+            emails = (
+                df[col].fillna('').astype(str).reset_index(drop=True)
+                .str.split(_SPLIT_RE)
+                .explode()
+                .str.strip()
+            )
+            emails = emails[emails != '']
+
+            # Recipients repeat across invoices; match each address only once
+            distinct = pd.Series(emails.unique(), dtype=object)
+            valid = distinct[distinct.str.match(_EMAIL_RE).astype(bool)]
+            bad = emails[~emails.isin(valid)]
+
+            invalid_parts.append(pd.DataFrame({
+                'position': bad.index,
+                'order': order,
+                'label': label,
+                'email': bad.values,
+            }))
+
+        if not invalid_parts:
+            return []
+
+        # Report row by row (To, CC, BCC within a row), like a row-wise scan
+        invalid = pd.concat(invalid_parts).sort_values(['position', 'order'], kind='stable')
+
+        return [
+            f"Row {df.index[position] + 2}: Invalid {label} email: {email}"
+            for position, label, email in zip(invalid['position'], invalid['label'], invalid['email'])
+        ]
 
     def validate_attachments(self, df: pd.DataFrame, base_path: str = None) -> List[str]:
         """
         Validate that attachment files exist.
 
+        Paths of the attachments found are kept in verified_attachments.
+
         Args:
             df: DataFrame to validate
             base_path: Base directory for attachment paths
@@ -163,6 +263,8 @@ class CSVParser:
         Returns:
             List of validation errors
         """
+        self.verified_attachments = set()
+
         if not self.validation.get('check_attachments', True):
             return []
 
@@ -172,22 +274,71 @@ class CSVParser:
         if not attachment_col or attachment_col not in df.columns:
             return []
 
-        for idx, row in df.iterrows():
-            attachment_path = row.get(attachment_col, '')
-            if attachment_path and attachment_path != '':
-                # Resolve path (absolute or relative to base_path)
-                if base_path:
-                    full_path = Path(base_path) / attachment_path
-                else:
-                    full_path = Path(attachment_path)
-
-                if not full_path.exists():
-                    errors.append(
-                        f"Row {idx + 2}: Attachment file not found: {attachment_path}"
-                    )
+        # One entry per attachment, indexed by the row it came from
+        attachments = (
+            df[attachment_col].fillna('').astype(str)
+            .str.replace(';', ',', regex=False)
+            .str.split(',')
+            .explode()
+            .str.strip()
+        )
+        attachments = attachments[attachments != '']
+
+        base_dir = Path(base_path) if base_path else Path('.')
+
+        # List each attachment directory once instead of stat'ing every file
+        listings: Dict[Path, Set[str]] = {}
+        found = {}
+        unconfirmed = []
+
+        for attachment in attachments.unique():
+            full_path = base_dir / attachment
+            parent = full_path.parent
+
+            if parent not in listings:
+                listings[parent] = self._list_directory(parent)
+
+            if full_path.name in listings[parent]:
+                found[attachment] = True
+            else:
+                unconfirmed.append(attachment)
+
+        # Check the rest individually (unreadable directories, case-insensitive
+        # file systems); stats run concurrently as each may be a network round-trip
+        if unconfirmed:
+            with ThreadPoolExecutor(max_workers=min(32, len(unconfirmed))) as executor:
+                exists = executor.map(lambda attachment: (base_dir / attachment).exists(), unconfirmed)
+                found.update(zip(unconfirmed, exists))
+
+        self.verified_attachments = {
+            base_dir / attachment for attachment, exists in found.items() if exists
+        }
+
+        missing = attachments[~attachments.map(found).astype(bool)]
+
+        for idx, attachment_path in missing.items():
+            errors.append(
+                f"Row {idx + 2}: Attachment file not found: {attachment_path}"
+            )
 
         return errors
 
+    @staticmethod
+    def _list_directory(directory: Path) -> Set[str]:
+        """
+        List entry names in a directory.
+
+        Args:
+            directory: Directory to list
+
+        Returns:
+            Set of entry names (empty if the directory can't be read)
+        """
+        try:
+            return set(os.listdir(directory))
+        except OSError:
+            return set()
+
     @staticmethod
     def _split_emails(email_string: str) -> List[str]:
         """
@@ -203,5 +354,5 @@ class CSVParser:
             return []
 
         # Split by semicolon or comma
-        emails = re.split(r'[;,]', email_string)
+        emails = _SPLIT_RE.split(email_string)
         return [email.strip() for email in emails if email.strip()]
@@ -5,8 +5,14 @@ Handles email template rendering and generation.
 
 from jinja2 import Environment, FileSystemLoader, Template
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Set
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+import multiprocessing
+import os
+import re
+import string
 import logging
 
 from src.msg_creator import EmailFileCreator
@@ -14,6 +20,19 @@ from src.utils import resolve_attachment_path, get_attachment_filename, format_t
 
 logger = logging.getLogger(__name__)
 
+# Batches smaller than this are generated serially; the process pool
+# start-up cost outweighs the speedup for a handful of emails
+PARALLEL_THRESHOLD = 8
+
+# Upper bound on emails handed to a pool worker per dispatch
+MAX_CHUNK_SIZE = 64
+
+# Generator instance owned by each pool worker process
+_worker_generator = None
+
+# Separators in an address's local part that become spaces in a name
+_NAME_TRANS = str.maketrans('._', '  ')
+
 
 class EmailGenerator:
     """Generates email files from templates and data."""
@@ -29,14 +48,55 @@ class EmailGenerator:
         self.template_path = config.get('paths', {}).get('template', 'config/template.html')
         self.output_dir = Path(config.get('paths', {}).get('output', 'output'))
         self.attachment_base = config.get('paths', {}).get('attachment_base', '')
+        self.from_email = config.get('email', {}).get('from', '')
+
+        # Output filename pattern and the variables it references
+        output_config = config.get('output', {})
+        self.filename_pattern = output_config.get('filename_pattern', '{entity}_{invoice}_{timestamp}')
+        self.add_timestamp = output_config.get('timestamp', True)
+        self.max_workers = self._parse_worker_limit(output_config.get('workers'))
+        self._pattern_fields = {
+            re.split(r'[.\[]', field_name, maxsplit=1)[0]
+            for _, field_name, _, _ in string.Formatter().parse(self.filename_pattern)
+            if field_name
+        }
 
         # Initialize Jinja2 environment
         template_file = Path(self.template_path)
         template_dir = template_file.parent
         template_name = template_file.name
 
-        self.jinja_env = Environment(loader=FileSystemLoader(str(template_dir)))
+        # The template is fixed for the lifetime of a run, so skip up-to-date checks
+        self.jinja_env = Environment(
+            loader=FileSystemLoader(str(template_dir)),
+            auto_reload=False,
+            cache_size=-1
+        )
         self.template = self.jinja_env.get_template(template_name)
+        self._render = self.template.render
+
+        # Template context shared by every email
+        company = config.get('company', {})
+        self._base_context = {
+            'company_name': company.get('name', 'Your Company'),
+            'sender_name': company.get('sender_name', 'Accounts Receivable'),
+            'sender_title': company.get('sender_title', 'Billing Department'),
+            'current_year': datetime.now().year,
+        }
+
+        # Add banner path if exists
+        banner_path = config.get('paths', {}).get('banner')
+        if banner_path and Path(banner_path).exists():
+            self._base_context['banner_path'] = banner_path
+
+        # Resolved attachment paths for the current batch (None if missing)
+        self._attachment_cache: Dict[str, Optional[Path]] = {}
+
+        # Attachment paths already known to exist (e.g. from CSV validation)
+        self._verified_attachments: Set[Path] = set()
+
+        # Attachment checks are only cached while a batch is being generated
+        self._in_batch = False
 
         # Initialize email file creator
         self.email_creator = EmailFileCreator(config)
@@ -56,11 +116,17 @@ class EmailGenerator:
         Returns:
             Path to generated email file
         """
+        get = email_data.get
+
+        # Outside a batch, check attachments on disk afresh for every email
+        if not self._in_batch:
+            self._reset_attachment_state()
+
         # Render HTML body
         html_body = self._render_template(email_data)
 
         # Resolve attachment paths
-        attachment_paths = self._resolve_attachments(email_data.get('attachments', []))
+        attachment_paths = self._resolve_attachments(get('attachments', []))
 
         # Generate output filename
         output_path = self._generate_output_path(email_data)
@@ -68,12 +134,12 @@ class EmailGenerator:
         # Create email file
         email_file = self.email_creator.create_email_file(
             output_path=output_path,
-            to=email_data.get('to', ''),
-            subject=email_data.get('subject', 'Invoice Notification'),
+            to=get('to', ''),
+            subject=get('subject', 'Invoice Notification'),
             html_body=html_body,
-            cc=email_data.get('cc', ''),
-            bcc=email_data.get('bcc', ''),
-            from_email=self.config.get('email', {}).get('from', ''),
+            cc=get('cc', ''),
+            bcc=get('bcc', ''),
+            from_email=self.from_email,
             attachments=attachment_paths
         )
 
@@ -91,19 +157,9 @@ class EmailGenerator:
             Rendered HTML string
         """
         # Prepare template context
-        context = {
-            'company_name': self.config.get('company', {}).get('name', 'Your Company'),
-            'sender_name': self.config.get('company', {}).get('sender_name', 'Accounts Receivable'),
-            'sender_title': self.config.get('company', {}).get('sender_title', 'Billing Department'),
-            'current_year': datetime.now().year,
-            'is_group': email_data.get('is_group', False),
-            'custom_message': email_data.get('custom_message', ''),
-        }
-
-        # Add banner path if exists
-        banner_path = self.config.get('paths', {}).get('banner')
-        if banner_path and Path(banner_path).exists():
-            context['banner_path'] = banner_path
+        context = self._base_context.copy()
+        context['is_group'] = email_data.get('is_group', False)
+        context['custom_message'] = email_data.get('custom_message', '')
 
         # Add attachments list (filenames only)
         attachments = email_data.get('attachments', [])
@@ -127,7 +183,7 @@ class EmailGenerator:
             })
 
         # Render template
-        return self.template.render(**context)
+        return self._render(**context)
 
     def _resolve_attachments(self, attachment_list: List[str]) -> List[Path]:
         """
@@ -145,44 +201,65 @@ class EmailGenerator:
             if not attachment:
                 continue
 
-            resolved_path = resolve_attachment_path(attachment, self.attachment_base)
-
-            if resolved_path.exists():
+            # The same attachment is often shared by many emails in a batch
+            if attachment in self._attachment_cache:
+                resolved_path = self._attachment_cache[attachment]
+            else:
+                resolved_path = resolve_attachment_path(attachment, self.attachment_base)
+                if resolved_path in self._verified_attachments:
+                    pass
+                elif resolved_path.exists():
+                    self._verified_attachments.add(resolved_path)
+                else:
+                    resolved_path = None
+                self._attachment_cache[attachment] = resolved_path
+
+            if resolved_path is not None:
                 resolved.append(resolved_path)
             else:
                 logger.warning(f"Attachment not found: {attachment}")
 
         return resolved
 
-    def _generate_output_path(self, email_data: Dict[str, Any]) -> Path:
+    def _generate_output_path(self, email_data: Dict[str, Any], timestamp: Optional[str] = None) -> Path:
         """
         Generate output file path for email.
 
         Args:
             email_data: Dictionary containing email information
+            timestamp: Timestamp to use instead of the current time
 
         Returns:
             Path object for output file (without extension)
         """
-        # Get filename pattern from config
-        pattern = self.config.get('output', {}).get('filename_pattern', '{entity}_{invoice}_{timestamp}')
-        add_timestamp = self.config.get('output', {}).get('timestamp', True)
+        is_group = email_data.get('is_group')
+        fields = self._pattern_fields
 
-        # Prepare variables
-        if email_data.get('is_group'):
-            entity = email_data.get('group_name', 'Group')
-            invoice = 'Multiple'
-        else:
-            entity = email_data.get('entity_name', 'Entity')
-            invoice = email_data.get('invoice_number', '0000')
+        # Prepare only the variables the pattern uses
+        variables = {}
+
+        if 'entity' in fields:
+            if is_group:
+                entity = email_data.get('group_name', 'Group')
+            else:
+                entity = email_data.get('entity_name', 'Entity')
+            variables['entity'] = sanitize_filename(entity)
+
+        if 'group' in fields:
+            variables['group'] = sanitize_filename(email_data.get('group_name', 'Group'))
+
+        if 'invoice' in fields:
+            invoice = 'Multiple' if is_group else email_data.get('invoice_number', '0000')
+            variables['invoice'] = sanitize_filename(invoice)
+
+        if 'timestamp' in fields:
+            if not self.add_timestamp:
+                variables['timestamp'] = ''
+            else:
+                variables['timestamp'] = timestamp if timestamp is not None else format_timestamp()
 
         # Format filename
-        filename = pattern.format(
-            entity=sanitize_filename(entity),
-            group=sanitize_filename(email_data.get('group_name', 'Group')),
-            invoice=sanitize_filename(invoice),
-            timestamp=format_timestamp() if add_timestamp else ''
-        )
+        filename = self.filename_pattern.format(**variables)
 
         # Remove trailing underscores
         filename = filename.rstrip('_')
@@ -205,38 +282,256 @@ class EmailGenerator:
             return 'Valued Customer'
 
         # Get first email if multiple
-        first_email = email.split(',')[0].split(';')[0].strip()
+        first_email = email.partition(',')[0].partition(';')[0].strip()
 
         # Extract name part before @
-        name_part = first_email.split('@')[0]
+        name_part = first_email.partition('@')[0]
 
         # Replace dots and underscores with spaces, capitalize
-        name = name_part.replace('.', ' ').replace('_', ' ').title()
+        name = name_part.translate(_NAME_TRANS).title()
 
         return name if name else 'Valued Customer'
 
-    def generate_batch(self, email_groups: List[Dict[str, Any]]) -> List[Path]:
+    def generate_batch(
+        self,
+        email_groups: List[Dict[str, Any]],
+        verified_attachments: Optional[Set[Path]] = None
+    ) -> List[Path]:
         """
         Generate multiple email files from list of email groups.
 
         Args:
             email_groups: List of email data dictionaries
+            verified_attachments: Attachment paths already known to exist,
+                which are attached without checking the file system again
 
         Returns:
             List of generated email file paths
         """
-        generated_files = []
+        total = len(email_groups)
+        logger.info(f"Generating {total} email files...")
+
+        self._start_batch(set(verified_attachments or ()))
+
+        try:
+            workers = self._worker_count(total)
+            if workers > 1:
+                # Emails that would be written to the same file are generated here,
+                # in batch order, so the last one wins as in a serial run
+                serial = self._colliding_outputs(email_groups)
+                parallel = [i for i in range(total) if i not in serial]
+                results: List[Optional[Path]] = [None] * total
+
+                # Send emails in chunks to amortize inter-process overhead, while
+                # keeping several chunks per worker so the load stays balanced
+                chunksize = max(1, min(MAX_CHUNK_SIZE, len(parallel) // (workers * 4)))
+
+                logger.debug(f"Generating in parallel with {workers} worker processes")
+
+                # Workers send their log records back so they reach this process's handlers
+                log_queue = multiprocessing.Queue()
+                listener = QueueListener(log_queue, *logging.getLogger().handlers, respect_handler_level=True)
+                listener_started = False
+                try:
+                    with ProcessPoolExecutor(
+                        max_workers=workers,
+                        initializer=_init_worker,
+                        initargs=(
+                            self.config, self._verified_attachments,
+                            log_queue, logging.getLogger().getEffectiveLevel()
+                        )
+                    ) as executor:
+                        pool_results = executor.map(
+                            _generate_in_worker,
+                            [i + 1 for i in parallel],
+                            [email_groups[i] for i in parallel],
+                            [total] * len(parallel),
+                            chunksize=chunksize
+                        )
+
+                        # Submitting has started the workers; only now start the listener
+                        # thread, as forking a process that runs threads is unsafe
+                        listener.start()
+                        listener_started = True
+
+                        for i in sorted(serial):
+                            results[i] = self._generate_one(i + 1, email_groups[i], total)
+                        for i, email_file in zip(parallel, pool_results):
+                            results[i] = email_file
+                finally:
+                    if listener_started:
+                        listener.stop()
+            else:
+                results = [
+                    self._generate_one(i, email_data, total)
+                    for i, email_data in enumerate(email_groups, 1)
+                ]
+        finally:
+            self._end_batch()
+
+        generated_files = [email_file for email_file in results if email_file is not None]
+
+        logger.info(f"Successfully generated {len(generated_files)} email files")
+        return generated_files
 
-        logger.info(f"Generating {len(email_groups)} email files...")
+    def _generate_one(self, index: int, email_data: Dict[str, Any], total: int) -> Optional[Path]:
+        """
+        Generate a single email file, logging instead of raising on failure.
 
-        for i, email_data in enumerate(email_groups, 1):
+        Args:
+            index: 1-based position of the email in the batch
+            email_data: Dictionary containing email information
+            total: Number of emails in the batch
+
+        Returns:
+            Path to generated email file, or None if generation failed
+        """
+        try:
+            email_file = self.generate_email(email_data)
+            logger.debug(f"Progress: {index}/{total}")
+            return email_file
+        except Exception as e:
+            logger.error(f"Error generating email {index}: {str(e)}")
+            return None
+
+    def _colliding_outputs(self, email_groups: List[Dict[str, Any]]) -> Set[int]:
+        """
+        Find emails that would be written to the same output file.
+
+        Args:
+            email_groups: List of email data dictionaries
+
+        Returns:
+            Indices of every email that shares its output file with another
+        """
+        # One timestamp for all, as emails generated within a second share it
+        timestamp = format_timestamp()
+        extension = self.email_creator.get_file_extension()
+
+        emails_by_file: Dict[str, List[int]] = {}
+        for i, email_data in enumerate(email_groups):
             try:
-                email_file = self.generate_email(email_data)
-                generated_files.append(email_file)
-                logger.debug(f"Progress: {i}/{len(email_groups)}")
-            except Exception as e:
-                logger.error(f"Error generating email {i}: {str(e)}")
+                output_file = self._generate_output_path(email_data, timestamp).with_suffix(extension)
+            except Exception:
+                # Reported when the email itself is generated
                 continue
+            emails_by_file.setdefault(os.path.normcase(str(output_file)), []).append(i)
 
-        logger.info(f"Successfully generated {len(generated_files)} email files")
-        return generated_files
+        return {i for indices in emails_by_file.values() if len(indices) > 1 for i in indices}
+
+    def _start_batch(self, verified_attachments: Set[Path]) -> None:
+        """
+        Start caching attachment checks, which are repeated for every batch.
+
+        Args:
+            verified_attachments: Attachment paths already known to exist
+        """
+        self._reset_attachment_state()
+        self._verified_attachments = verified_attachments
+        self._in_batch = True
+
+    def _end_batch(self) -> None:
+        """Stop caching attachment checks and drop those cached for the batch."""
+        self._in_batch = False
+        self._reset_attachment_state()
+
+    def _reset_attachment_state(self) -> None:
+        """Forget which attachments were found on disk and their file details."""
+        self._attachment_cache.clear()
+        self._verified_attachments = set()
+        self.email_creator.clear_attachment_stats()
+
+    @staticmethod
+    def _parse_worker_limit(value: Any) -> Optional[int]:
+        """
+        Validate the output.workers setting.
+
+        Args:
+            value: Configured value (empty or 0 for one worker per CPU)
+
+        Returns:
+            Maximum number of worker processes, or None for no limit
+
+        Raises:
+            ValueError: If the value is not a whole number of at least 0
+        """
+        if value is None or (isinstance(value, str) and not value.strip()):
+            return None
+
+        if isinstance(value, str) and value.strip().isdigit():
+            value = int(value)
+
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise ValueError(
+                f"Invalid output.workers setting: {value!r} "
+                f"(expected a whole number >= 0, or empty for one per CPU)"
+            )
+
+        return value or None
+
+    def _worker_count(self, total: int) -> int:
+        """
+        Determine how many worker processes to use for a batch.
+
+        Args:
+            total: Number of emails in the batch
+
+        Returns:
+            Number of workers (1 means generate serially)
+        """
+        # Outlook COM automation must stay on the calling thread
+        if self.email_creator.use_msg or total < PARALLEL_THRESHOLD:
+            return 1
+
+        workers = os.cpu_count() or 1
+        if self.max_workers:
+            workers = min(workers, self.max_workers)
+
+        return max(1, min(workers, total))
+
+
+def _init_worker(
+    config: Dict[str, Any],
+    verified_attachments: Set[Path],
+    log_queue: Any,
+    log_level: int
+) -> None:
+    """
+    Create the generator used by a pool worker process.
+
+    Args:
+        config: Configuration dictionary
+        verified_attachments: Attachment paths already known to exist
+        log_queue: Queue forwarding log records to the parent process
+        log_level: Log level of the parent process
+    """
+    global _worker_generator
+
+    # Route all records through the parent, replacing any handlers inherited on fork
+    root_logger = logging.getLogger()
+    root_logger.handlers[:] = [QueueHandler(log_queue)]
+    root_logger.setLevel(log_level)
+
+    # The parent has already logged the generator's start-up messages
+    logging.disable(logging.INFO)
+    try:
+        _worker_generator = EmailGenerator(config)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    _worker_generator._start_batch(verified_attachments)
+
+
+def _generate_in_worker(index: int, email_data: Dict[str, Any], total: int) -> Optional[Path]:
+    """
+    Generate a single email file inside a pool worker process.
+
+    Args:
+        index: 1-based position of the email in the batch
+        email_data: Dictionary containing email information
+        total: Number of emails in the batch
+
+    Returns:
+        Path to generated email file, or None if generation failed
+    """
+    return _worker_generator._generate_one(index, email_data, total)
@@ -5,20 +5,41 @@ Generates Outlook .msg or .eml files from CSV data with attachments.
 """
 
 import argparse
+import copy
 import sys
+from collections import Counter
+from itertools import islice
 import yaml
 import logging
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from colorama import init, Fore, Style
 
 from src.csv_parser import CSVParser
 from src.utils import EmailGrouper
 from src.email_generator import EmailGenerator
 
+# Prefer the libyaml-backed loader when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
 # Initialize colorama for cross-platform colored output
 init(autoreset=True)
 
+# Application banner, with and without colour codes
+_BANNER_BOX = """\
+╔═══════════════════════════════════════════════════════╗
+║         CSV Email Tool - Invoice Email Generator     ║
+║                    Version 1.0.0                      ║
+╚═══════════════════════════════════════════════════════╝"""
+_BANNER = f"\n{Fore.CYAN}{_BANNER_BOX}{Style.RESET_ALL}\n\n"
+_BANNER_PLAIN = f"\n{_BANNER_BOX}\n\n"
+
+# Parsed configuration cache: resolved path -> (mtime_ns, config)
+_config_cache: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+
 
 def setup_logging(config: Dict[str, Any]) -> None:
     """
@@ -61,6 +82,9 @@ def load_config(config_path: str) -> Dict[str, Any]:
     """
     Load configuration from YAML file.
 
+    The parsed configuration is cached per file and reused until the
+    file's modification time changes.
+
     Args:
         config_path: Path to configuration file
 
@@ -74,9 +98,17 @@ def load_config(config_path: str) -> Dict[str, Any]:
         sys.exit(1)
 
     try:
-        with open(config_file, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
-        return config
+        cache_key = str(config_file.resolve())
+        mtime_ns = config_file.stat().st_mtime_ns
+
+        cached = _config_cache.get(cache_key)
+        if cached is None or cached[0] != mtime_ns:
+            with open(config_file, 'r', encoding='utf-8') as f:
+                cached = (mtime_ns, yaml.load(f, Loader=SafeLoader))
+            _config_cache[cache_key] = cached
+
+        # Callers may modify the config (e.g. --verbose), so hand out a copy
+        return copy.deepcopy(cached[1])
     except Exception as e:
         print(f"{Fore.RED}Error loading configuration: {str(e)}{Style.RESET_ALL}")
         sys.exit(1)
@@ -84,13 +116,9 @@ def load_config(config_path: str) -> Dict[str, Any]:
 
 def print_banner():
     """Print application banner."""
-    banner = f"""
-{Fore.CYAN}╔═══════════════════════════════════════════════════════╗
-║         CSV Email Tool - Invoice Email Generator     ║
-║                    Version 1.0.0                      ║
-╚═══════════════════════════════════════════════════════╝{Style.RESET_ALL}
-"""
-    print(banner)
+    # Leave out colour codes when output is piped or redirected
+    is_tty = getattr(sys.stdout, 'isatty', None)
+    sys.stdout.write(_BANNER if is_tty and is_tty() else _BANNER_PLAIN)
 
 
 def print_summary(email_groups: list, generated_files: list, config: Dict[str, Any]):
@@ -108,9 +136,10 @@ def print_summary(email_groups: list, generated_files: list, config: Dict[str, A
 
     print(f"📧 Total emails generated: {Fore.CYAN}{len(generated_files)}{Style.RESET_ALL}")
 
-    # Count single vs group emails
-    single_count = sum(1 for eg in email_groups if not eg.get('is_group'))
-    group_count = sum(1 for eg in email_groups if eg.get('is_group'))
+    # Count single vs group emails in one pass
+    counts = Counter(bool(eg.get('is_group')) for eg in email_groups)
+    single_count = counts[False]
+    group_count = counts[True]
 
     print(f"   - Single invoice emails: {single_count}")
     print(f"   - Grouped invoice emails: {group_count}")
@@ -119,16 +148,32 @@ def print_summary(email_groups: list, generated_files: list, config: Dict[str, A
     output_dir = Path(config.get('paths', {}).get('output', 'output'))
     print(f"\n📁 Output directory: {Fore.CYAN}{output_dir.absolute()}{Style.RESET_ALL}")
 
-    # List generated files
+    # List generated files, written out in one go
     if generated_files and len(generated_files) <= 10:
-        print(f"\n📄 Generated files:")
-        for file in generated_files:
-            print(f"   - {file.name}")
+        lines = ["\n📄 Generated files:"]
+        lines.extend(f"   - {file.name}" for file in generated_files)
+        sys.stdout.write("\n".join(lines) + "\n")
     elif len(generated_files) > 10:
-        print(f"\n📄 Generated files: (showing first 10)")
-        for file in generated_files[:10]:
-            print(f"   - {file.name}")
-        print(f"   ... and {len(generated_files) - 10} more")
+        lines = ["\n📄 Generated files: (showing first 10)"]
+        lines.extend(f"   - {file.name}" for file in islice(generated_files, 10))
+        lines.append(f"   ... and {len(generated_files) - 10} more")
+        sys.stdout.write("\n".join(lines) + "\n")
+
+
+def print_errors(title: str, errors: List[str], limit: int = 10):
+    """
+    Print the first validation errors under a heading with a single write.
+
+    Args:
+        title: Heading printed above the errors
+        errors: Validation error messages
+        limit: Maximum number of errors to show
+    """
+    lines = [f"\n{Fore.RED}{title}{Style.RESET_ALL}"]
+    lines.extend(f"  ❌ {error}" for error in islice(errors, limit))
+    if len(errors) > limit:
+        lines.append(f"  ... and {len(errors) - limit} more errors")
+    sys.stdout.write("\n".join(lines) + "\n")
 
 
 def validate_csv_data(parser: CSVParser, df, config: Dict[str, Any]) -> bool:
@@ -148,21 +193,13 @@ def validate_csv_data(parser: CSVParser, df, config: Dict[str, Any]) -> bool:
     # Validate emails
     email_errors = parser.validate_emails(df)
     if email_errors:
-        print(f"\n{Fore.RED}Email validation errors:{Style.RESET_ALL}")
-        for error in email_errors[:10]:  # Show first 10 errors
-            print(f"  ❌ {error}")
-        if len(email_errors) > 10:
-            print(f"  ... and {len(email_errors) - 10} more errors")
+        print_errors("Email validation errors:", email_errors)
 
     # Validate attachments
     attachment_base = config.get('paths', {}).get('attachment_base')
     attachment_errors = parser.validate_attachments(df, attachment_base)
     if attachment_errors:
-        print(f"\n{Fore.RED}Attachment validation errors:{Style.RESET_ALL}")
-        for error in attachment_errors[:10]:  # Show first 10 errors
-            print(f"  ❌ {error}")
-        if len(attachment_errors) > 10:
-            print(f"  ... and {len(attachment_errors) - 10} more errors")
+        print_errors("Attachment validation errors:", attachment_errors)
 
     total_errors = len(email_errors) + len(attachment_errors)
 
@@ -174,8 +211,16 @@ def validate_csv_data(parser: CSVParser, df, config: Dict[str, Any]) -> bool:
         return True
 
 
-def main():
-    """Main application entry point."""
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Main application entry point.
+
+    Args:
+        argv: Command-line arguments (defaults to sys.argv[1:])
+
+    Returns:
+        Exit code
+    """
     # Parse command-line arguments
     parser = argparse.ArgumentParser(
         description='Generate Outlook .msg or .eml files from CSV data',
@@ -211,7 +256,7 @@ Examples:
         help='Enable verbose output'
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Print banner
     print_banner()
@@ -260,7 +305,10 @@ Examples:
 
         # Generate emails
         print(f"\n⚙️  Generating email files...")
-        generated_files = email_generator.generate_batch(email_groups)
+        generated_files = email_generator.generate_batch(
+            email_groups,
+            verified_attachments=csv_parser.verified_attachments
+        )
 
         # Print summary
         print_summary(email_groups, generated_files, config)
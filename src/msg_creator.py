@@ -3,17 +3,27 @@ MSG/EML Creator Module
 Handles cross-platform creation of Outlook .msg and .eml files.
 """
 
+import base64
+import mmap
+import os
 import platform
 import logging
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from email.generator import BytesGenerator
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
-from email import encoders
 
 logger = logging.getLogger(__name__)
 
+# Attachments larger than this are encoded on every use instead of cached
+MAX_CACHED_ATTACHMENT_SIZE = 2 * 1024 * 1024
+
+# Upper bound on the total size of cached base64 payloads, per process
+MAX_ATTACHMENT_CACHE_BYTES = 16 * 1024 * 1024
+
 
 class EmailFileCreator:
     """Creates email files in .msg (Windows) or .eml (cross-platform) format."""
@@ -37,6 +47,12 @@ class EmailFileCreator:
         else:
             self.use_msg = False
 
+        # Outlook application object, created on first .msg file
+        self._outlook = None
+
+        # stat() results of attachments for the current batch (None if missing)
+        self._attachment_stats: Dict[Path, Optional[os.stat_result]] = {}
+
         logger.info(f"Email format: {'MSG' if self.use_msg else 'EML'} (Platform: {self.platform})")
 
     def create_email_file(
@@ -123,15 +139,26 @@ class EmailFileCreator:
         # Add attachments
         if attachments:
             for attachment_path in attachments:
-                if attachment_path.exists():
-                    self._attach_file_to_mime(msg, attachment_path)
-                else:
+                stat = self._stat_attachment(attachment_path)
+                if stat is None:
                     logger.warning(f"Attachment not found: {attachment_path}")
+                    continue
 
-        # Write to file
+                try:
+                    self._attach_file_to_mime(msg, attachment_path, stat)
+                except OSError as e:
+                    # The file may have been removed since it was checked
+                    logger.warning(f"Attachment could not be read: {attachment_path} ({e})")
+
+        # Stream to file instead of building the whole message string first.
+        # Line endings follow the platform, as the text-mode write used to.
         eml_path = output_path.with_suffix('.eml')
-        with open(eml_path, 'w', encoding='utf-8') as f:
-            f.write(msg.as_string())
+        with open(eml_path, 'wb') as f:
+            generator = BytesGenerator(
+                f, mangle_from_=False, maxheaderlen=0,
+                policy=msg.policy.clone(linesep=os.linesep)
+            )
+            generator.flatten(msg)
 
         logger.debug(f"Created EML file: {eml_path}")
         return eml_path
@@ -172,8 +199,7 @@ class EmailFileCreator:
             )
 
         try:
-            # Create Outlook application object
-            outlook = win32com.client.Dispatch("Outlook.Application")
+            outlook = self._get_outlook(win32com.client)
             mail = outlook.CreateItem(0)  # 0 = MailItem
 
             # Set email properties
@@ -188,7 +214,7 @@ class EmailFileCreator:
             # Add attachments
             if attachments:
                 for attachment_path in attachments:
-                    if attachment_path.exists():
+                    if self._stat_attachment(attachment_path) is not None:
                         mail.Attachments.Add(str(attachment_path.absolute()))
                     else:
                         logger.warning(f"Attachment not found: {attachment_path}")
@@ -201,26 +227,75 @@ class EmailFileCreator:
             return msg_path
 
         except Exception as e:
+            # Drop the cached application in case Outlook went away
+            self._outlook = None
             logger.error(f"Error creating MSG file: {str(e)}")
             logger.warning("Falling back to EML format.")
             return self._create_eml_file(
                 output_path, to, subject, html_body, cc, bcc, from_email, attachments
             )
 
+    def _get_outlook(self, client: Any) -> Any:
+        """
+        Get the Outlook application object, creating it on first use.
+
+        Args:
+            client: The win32com.client module
+
+        Returns:
+            Outlook application COM object
+        """
+        if self._outlook is None:
+            try:
+                # Early binding turns property sets into direct vtable calls
+                self._outlook = client.gencache.EnsureDispatch("Outlook.Application")
+            except Exception as e:
+                logger.debug(f"Early-bound Outlook dispatch failed, using late binding: {e}")
+                self._outlook = client.Dispatch("Outlook.Application")
+        return self._outlook
+
+    def clear_attachment_stats(self) -> None:
+        """Forget the attachment file information gathered for the previous batch."""
+        self._attachment_stats.clear()
+
+    def _stat_attachment(self, file_path: Path) -> Optional[os.stat_result]:
+        """
+        Get file information for an attachment, once per batch.
+
+        Args:
+            file_path: Path to attachment
+
+        Returns:
+            stat() result, or None if the file cannot be accessed
+        """
+        if file_path not in self._attachment_stats:
+            try:
+                self._attachment_stats[file_path] = file_path.stat()
+            except OSError:
+                self._attachment_stats[file_path] = None
+        return self._attachment_stats[file_path]
+
     @staticmethod
-    def _attach_file_to_mime(msg: MIMEMultipart, file_path: Path) -> None:
+    def _attach_file_to_mime(msg: MIMEMultipart, file_path: Path, stat: os.stat_result) -> None:
         """
         Attach file to MIME message.
 
         Args:
             msg: MIME message object
             file_path: Path to file to attach
+            stat: stat() result of the file
         """
-        with open(file_path, 'rb') as f:
-            part = MIMEBase('application', 'octet-stream')
-            part.set_payload(f.read())
+        if stat.st_size <= MAX_CACHED_ATTACHMENT_SIZE:
+            payload = _attachment_cache.get(str(file_path), stat.st_mtime_ns, stat.st_size)
+            if payload is None:
+                payload = _encode_attachment_base64(str(file_path))
+                _attachment_cache.put(str(file_path), stat.st_mtime_ns, stat.st_size, payload)
+        else:
+            payload = _encode_attachment_base64(str(file_path))
 
-        encoders.encode_base64(part)
+        part = MIMEBase('application', 'octet-stream')
+        part.set_payload(payload)
+        part['Content-Transfer-Encoding'] = 'base64'
         part.add_header(
             'Content-Disposition',
             f'attachment; filename={file_path.name}'
@@ -235,3 +310,93 @@ class EmailFileCreator:
             File extension ('.msg' or '.eml')
         """
         return '.msg' if self.use_msg else '.eml'
+
+
+def _encode_attachment_base64(path: str) -> str:
+    """
+    Read a file and base64-encode it for use as a MIME payload.
+
+    The file is memory-mapped and encoded straight from the mapping, so
+    its content is not first copied into a bytes object.
+
+    Args:
+        path: Path to file
+
+    Returns:
+        Base64-encoded file content, wrapped into MIME-sized lines
+    """
+    with open(path, 'rb') as f:
+        # Empty files cannot be mapped
+        if not os.fstat(f.fileno()).st_size:
+            return ''
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return base64.encodebytes(mm).decode('ascii')
+
+
+class _AttachmentCache:
+    """
+    Least-recently-used cache of base64-encoded attachments.
+
+    Attachments shared by many emails in a batch are read and encoded
+    only once. The cache is bounded by the total size of the payloads it
+    holds rather than by the number of files. Entries record the file's
+    modification time and size, so a file that changes on disk is re-read.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_bytes: Maximum total size of cached payloads
+        """
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        # path -> (mtime_ns, size, payload), least recently used first
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, path: str, mtime_ns: int, size: int) -> Optional[str]:
+        """
+        Get the cached payload for a file.
+
+        Args:
+            path: Path to file
+            mtime_ns: File modification time in nanoseconds
+            size: File size in bytes
+
+        Returns:
+            Base64-encoded file content, or None if not cached or stale
+        """
+        entry = self._entries.get(path)
+        if entry is None or entry[0] != mtime_ns or entry[1] != size:
+            return None
+
+        self._entries.move_to_end(path)
+        return entry[2]
+
+    def put(self, path: str, mtime_ns: int, size: int, payload: str) -> None:
+        """
+        Cache the payload for a file, evicting the least recently used ones.
+
+        Args:
+            path: Path to file
+            mtime_ns: File modification time in nanoseconds
+            size: File size in bytes
+            payload: Base64-encoded file content
+        """
+        old_entry = self._entries.pop(path, None)
+        if old_entry is not None:
+            self.total_bytes -= len(old_entry[2])
+
+        if len(payload) > self.max_bytes:
+            return
+
+        self._entries[path] = (mtime_ns, size, payload)
+        self.total_bytes += len(payload)
+
+        while self.total_bytes > self.max_bytes:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self.total_bytes -= len(evicted)
+
+
+_attachment_cache = _AttachmentCache(MAX_ATTACHMENT_CACHE_BYTES)
@@ -4,13 +4,21 @@ Contains helper functions for grouping, formatting, and validation.
 """
 
 import pandas as pd
-from typing import Dict, List, Any, Tuple
+import re
+import string
+import time
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
 from pathlib import Path
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Characters not allowed in filenames, mapped to underscore
+_INVALID_FILENAME_CHARS = str.maketrans({char: '_' for char in '<>:"/\\|?*'})
+_MULTI_UNDERSCORE_RE = re.compile(r'_{2,}')
+
 
 class EmailGrouper:
     """Handles grouping of emails based on CSV data."""
@@ -26,6 +34,27 @@ class EmailGrouper:
         self.csv_columns = config.get('csv_columns', {})
         self.grouping = config.get('grouping', {})
 
+        # Resolve column names once rather than per row
+        self._group_col = self.csv_columns.get('group')
+        self._entity_col = self.csv_columns.get('entity_name', '')
+        self._invoice_col = self.csv_columns.get('invoice_number', '')
+        self._amount_col = self.csv_columns.get('amount', '')
+        self._due_date_col = self.csv_columns.get('due_date', '')
+        self._message_col = self.csv_columns.get('custom_message', '')
+        self._subject_col = self.csv_columns.get('subject')
+        self._attachment_col = self.csv_columns.get('attachment')
+        self._to_col = self.csv_columns.get('to')
+        self._cc_col = self.csv_columns.get('cc')
+        self._bcc_col = self.csv_columns.get('bcc')
+
+        # Split the single-invoice subject template into literal text and field
+        # names when it only uses plain {entity_name}/{invoice_number} fields,
+        # so subjects can be built by column concatenation
+        self._subject_single = self.config.get('email', {}).get(
+            'subject_single', '{entity_name} Invoice {invoice_number}'
+        )
+        self._subject_parts = self._parse_subject_template(self._subject_single)
+
     def group_emails(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
         """
         Group DataFrame rows into individual or grouped emails.
@@ -37,118 +66,147 @@ class EmailGrouper:
             List of email group dictionaries
         """
         email_groups = []
-        group_col = self.csv_columns.get('group')
+        group_col = self._group_col
 
         # Check if grouping column exists and has values
         has_groups = group_col and group_col in df.columns
 
-        if has_groups:
-            # Process groups
-            grouped_df = df.groupby(group_col)
+        # Convert the mapped columns to plain row dicts in one pass instead of
+        # boxing every row into a Series
+        columns = [col for col in dict.fromkeys(self.csv_columns.values()) if col in df.columns]
+        frame = df[columns]
+
+        # Stringify the text and address fields column-wise once, with missing
+        # values as '', instead of calling pd.isna() and str() per cell
+        text_cols = [
+            col for col in (self._entity_col, self._invoice_col, self._amount_col,
+                            self._due_date_col, self._message_col,
+                            self._to_col, self._cc_col, self._bcc_col)
+            if col in frame.columns
+        ]
+        if text_cols:
+            frame = frame.assign(**{col: frame[col].fillna('').astype(str) for col in text_cols})
+
+        # Split attachment cells (separated by semicolon or comma) for the whole column at once
+        attachment_col = self._attachment_col
+        if attachment_col and attachment_col in frame.columns:
+            parts = frame[attachment_col].fillna('').astype(str).str.replace(';', ',', regex=False).str.split(',')
+            frame = frame.assign(_attachments=parts.map(lambda xs: [x.strip() for x in xs if x.strip()]))
+
+        # Build single-invoice subjects column-wise when the template allows it
+        if self._subject_parts is not None:
+            frame = frame.assign(_subject=self._build_single_subjects(frame))
+
+        rows = frame.to_dict('records')
 
-            for group_name, group_data in grouped_df:
+        if has_groups:
+            # Bucket rows by group, in the same sorted order groupby() uses;
+            # rows with a missing group key are dropped, as groupby() does
+            codes, group_names = pd.factorize(df[group_col], sort=True)
+            group_rows = [[] for _ in range(len(group_names))]
+            for code, row in zip(codes, rows):
+                if code >= 0:
+                    group_rows[code].append(row)
+
+            for group_name, group_data in zip(group_names, group_rows):
                 if pd.isna(group_name) or str(group_name).strip() == '':
                     # No group specified - create individual emails
-                    for _, row in group_data.iterrows():
+                    for row in group_data:
                         email_groups.append(self._create_single_email(row))
                 else:
                     # Create grouped email
                     email_groups.append(self._create_group_email(group_name, group_data))
         else:
             # No grouping column - create individual emails for all rows
-            for _, row in df.iterrows():
+            for row in rows:
                 email_groups.append(self._create_single_email(row))
 
         logger.info(f"Created {len(email_groups)} email groups")
         return email_groups
 
-    def _create_single_email(self, row: pd.Series) -> Dict[str, Any]:
+    def _create_single_email(self, row: Dict[str, Any]) -> Dict[str, Any]:
         """
         Create email data dictionary for a single invoice.
 
         Args:
-            row: DataFrame row
+            row: Row values keyed by column name
 
         Returns:
             Email data dictionary
         """
-        entity_name = str(row.get(self.csv_columns.get('entity_name', ''), ''))
-        invoice_number = str(row.get(self.csv_columns.get('invoice_number', ''), ''))
+        entity_name = row.get(self._entity_col, '')
+        invoice_number = row.get(self._invoice_col, '')
 
         # Get subject line (use custom if provided, otherwise generate)
-        subject_col = self.csv_columns.get('subject')
-        if subject_col and row.get(subject_col):
-            subject = str(row[subject_col])
-        else:
-            # Generate subject: "EntityName Invoice 0001"
-            subject = self._format_single_subject(entity_name, invoice_number)
-
-        # Parse attachment path
-        attachments = self._parse_attachments(row)
+        subject = row.get('_subject')
+        if subject is None:
+            subject_col = self._subject_col
+            if subject_col and row.get(subject_col):
+                subject = str(row[subject_col])
+            else:
+                # Generate subject: "EntityName Invoice 0001"
+                subject = self._format_single_subject(entity_name, invoice_number)
+
+        # Attachment paths were already split in group_emails
+        attachments = row.get('_attachments', [])
 
         return {
             'type': 'single',
-            'to': self._get_email_field(row, 'to'),
-            'cc': self._get_email_field(row, 'cc'),
-            'bcc': self._get_email_field(row, 'bcc'),
+            'to': row.get(self._to_col, ''),
+            'cc': row.get(self._cc_col, ''),
+            'bcc': row.get(self._bcc_col, ''),
             'subject': subject,
             'entity_name': entity_name,
             'invoice_number': invoice_number,
-            'amount': str(row.get(self.csv_columns.get('amount', ''), '')),
-            'due_date': str(row.get(self.csv_columns.get('due_date', ''), '')),
-            'custom_message': str(row.get(self.csv_columns.get('custom_message', ''), '')),
+            'amount': row.get(self._amount_col, ''),
+            'due_date': row.get(self._due_date_col, ''),
+            'custom_message': row.get(self._message_col, ''),
             'attachments': attachments,
             'is_group': False
         }
 
-    def _create_group_email(self, group_name: str, group_data: pd.DataFrame) -> Dict[str, Any]:
+    def _create_group_email(self, group_name: str, group_data: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         Create email data dictionary for grouped invoices.
 
         Args:
             group_name: Name of the group
-            group_data: DataFrame containing group rows
+            group_data: Rows belonging to the group
 
         Returns:
             Email data dictionary
         """
         # Use first row for common fields (To, CC, BCC)
-        first_row = group_data.iloc[0]
+        first_row = group_data[0]
 
-        # Collect all invoice numbers
-        invoice_numbers = [
-            str(row.get(self.csv_columns.get('invoice_number', ''), ''))
-            for _, row in group_data.iterrows()
-        ]
-
-        # Generate subject: "GroupName Invoices 0001 / 0002 / 0003"
-        subject = self._format_group_subject(group_name, invoice_numbers)
-
-        # Collect invoices data
+        # Collect invoice numbers, invoices data and attachments in one pass
+        invoice_numbers = []
         invoices = []
         all_attachments = []
 
-        for _, row in group_data.iterrows():
+        for row in group_data:
+            invoice_number = row.get(self._invoice_col, '')
+            invoice_numbers.append(invoice_number)
             invoices.append({
-                'entity_name': str(row.get(self.csv_columns.get('entity_name', ''), '')),
-                'invoice_number': str(row.get(self.csv_columns.get('invoice_number', ''), '')),
-                'amount': str(row.get(self.csv_columns.get('amount', ''), '')),
-                'due_date': str(row.get(self.csv_columns.get('due_date', ''), ''))
+                'entity_name': row.get(self._entity_col, ''),
+                'invoice_number': invoice_number,
+                'amount': row.get(self._amount_col, ''),
+                'due_date': row.get(self._due_date_col, '')
             })
+            all_attachments.extend(row.get('_attachments', []))
 
-            # Collect all attachments
-            attachments = self._parse_attachments(row)
-            all_attachments.extend(attachments)
+        # Generate subject: "GroupName Invoices 0001 / 0002 / 0003"
+        subject = self._format_group_subject(group_name, invoice_numbers)
 
         return {
             'type': 'group',
-            'to': self._get_email_field(first_row, 'to'),
-            'cc': self._get_email_field(first_row, 'cc'),
-            'bcc': self._get_email_field(first_row, 'bcc'),
+            'to': first_row.get(self._to_col, ''),
+            'cc': first_row.get(self._cc_col, ''),
+            'bcc': first_row.get(self._bcc_col, ''),
             'subject': subject,
             'group_name': str(group_name),
             'invoices': invoices,
-            'custom_message': str(first_row.get(self.csv_columns.get('custom_message', ''), '')),
+            'custom_message': first_row.get(self._message_col, ''),
             'attachments': all_attachments,
             'is_group': True
         }
@@ -164,63 +222,78 @@ class EmailGrouper:
         Returns:
             Formatted subject line
         """
-        template = self.config.get('email', {}).get('subject_single', '{entity_name} Invoice {invoice_number}')
-        return template.format(entity_name=entity_name, invoice_number=invoice_number)
+        return self._subject_single.format(entity_name=entity_name, invoice_number=invoice_number)
 
-    def _format_group_subject(self, group_name: str, invoice_numbers: List[str]) -> str:
+    @staticmethod
+    def _parse_subject_template(template: str) -> Optional[List[Tuple[str, Optional[str]]]]:
         """
-        Format subject line for grouped invoices.
+        Split a subject template into literal text and field names.
 
         Args:
-            group_name: Group name
-            invoice_numbers: List of invoice numbers
+            template: Single-invoice subject template
 
         Returns:
-            Formatted subject line
+            List of (literal, field) pairs, or None if the template uses
+            anything beyond plain {entity_name}/{invoice_number} fields
         """
-        # Join invoice numbers with " / "
-        invoice_numbers_str = ' / '.join(invoice_numbers)
-        template = self.config.get('email', {}).get('subject_group', '{group_name} Invoices {invoice_numbers}')
-        return template.format(group_name=group_name, invoice_numbers=invoice_numbers_str)
-
-    def _get_email_field(self, row: pd.Series, field: str) -> str:
+        try:
+            parsed = list(string.Formatter().parse(template))
+        except ValueError:
+            return None
+
+        parts = []
+        for literal, field, format_spec, conversion in parsed:
+            if field is not None and (field not in ('entity_name', 'invoice_number')
+                                      or format_spec or conversion):
+                return None
+            parts.append((literal, field))
+        return parts
+
+    def _build_single_subjects(self, frame: pd.DataFrame) -> pd.Series:
         """
-        Get email field value from row.
+        Build the single-invoice subject for every row at once.
 
         Args:
-            row: DataFrame row
-            field: Field name ('to', 'cc', 'bcc')
+            frame: DataFrame with stringified entity and invoice columns
 
         Returns:
-            Email addresses as string
+            Series of subject lines
         """
-        col = self.csv_columns.get(field)
-        if col and col in row.index:
-            value = row[col]
-            return str(value) if pd.notna(value) and str(value) != '' else ''
-        return ''
+        fields = {
+            'entity_name': frame[self._entity_col] if self._entity_col in frame.columns else '',
+            'invoice_number': frame[self._invoice_col] if self._invoice_col in frame.columns else '',
+        }
+
+        # Generate subject: "EntityName Invoice 0001"
+        subjects = pd.Series('', index=frame.index, dtype=object)
+        for literal, field in self._subject_parts:
+            subjects = subjects + literal
+            if field is not None:
+                subjects = subjects + fields[field]
+
+        # Use custom subject where one is provided
+        subject_col = self._subject_col
+        if subject_col and subject_col in frame.columns:
+            custom = frame[subject_col]
+            subjects = custom.astype(str).where(custom.fillna('').astype(bool), subjects)
+
+        return subjects
 
-    def _parse_attachments(self, row: pd.Series) -> List[str]:
+    def _format_group_subject(self, group_name: str, invoice_numbers: List[str]) -> str:
         """
-        Parse attachment paths from row.
+        Format subject line for grouped invoices.
 
         Args:
-            row: DataFrame row
+            group_name: Group name
+            invoice_numbers: List of invoice numbers
 
         Returns:
-            List of attachment paths
+            Formatted subject line
         """
-        attachment_col = self.csv_columns.get('attachment')
-        if not attachment_col or attachment_col not in row.index:
-            return []
-
-        attachment_value = row.get(attachment_col, '')
-        if pd.isna(attachment_value) or str(attachment_value).strip() == '':
-            return []
-
-        # Split by semicolon or comma
-        attachments = [a.strip() for a in str(attachment_value).replace(';', ',').split(',')]
-        return [a for a in attachments if a]
+        # Join invoice numbers with " / "
+        invoice_numbers_str = ' / '.join(invoice_numbers)
+        template = self.config.get('email', {}).get('subject_group', '{group_name} Invoices {invoice_numbers}')
+        return template.format(group_name=group_name, invoice_numbers=invoice_numbers_str)
 
 
 def resolve_attachment_path(attachment: str, base_path: str = None) -> Path:
@@ -268,9 +341,26 @@ def format_timestamp() -> str:
     Returns:
         Timestamp string (YYYYMMDD_HHMMSS)
     """
-    return datetime.now().strftime("%Y%m%d_%H%M%S")
+    return _format_timestamp_at(int(time.time()))
+
+
+@lru_cache(maxsize=1)
+def _format_timestamp_at(seconds: int) -> str:
+    """
+    Format a Unix time (whole seconds) as a filename timestamp.
 
+    Emails generated within the same second share one cached string.
 
+    Args:
+        seconds: Seconds since the epoch
+
+    Returns:
+        Timestamp string (YYYYMMDD_HHMMSS)
+    """
+    return datetime.fromtimestamp(seconds).strftime("%Y%m%d_%H%M%S")
+
+
+@lru_cache(maxsize=4096)
 def sanitize_filename(filename: str) -> str:
     """
     Sanitize filename by removing invalid characters.
@@ -281,13 +371,6 @@ def sanitize_filename(filename: str) -> str:
     Returns:
         Sanitized filename
     """
-    # Replace invalid characters with underscore
-    invalid_chars = '<>:"/\\|?*'
-    for char in invalid_chars:
-        filename = filename.replace(char, '_')
-
-    # Remove multiple underscores
-    while '__' in filename:
-        filename = filename.replace('__', '_')
-
+    # Replace invalid characters with underscore, then collapse repeats
+    filename = _MULTI_UNDERSCORE_RE.sub('_', filename.translate(_INVALID_FILENAME_CHARS))
     return filename.strip('_')
@@ -6,15 +6,20 @@ Email Viewer - View generated .eml files in readable format
 import sys
 import email
 from email import policy
+from email.iterators import typed_subpart_iterator
 from pathlib import Path
 import re
 
+STYLE_RE = re.compile(r'<style[^>]*>.*?</style>', re.DOTALL)
+TAG_RE = re.compile(r'<[^>]+>')
+BLANK_LINES_RE = re.compile(r'\n\s*\n')
+
 def decode_html(html_content):
     """Decode HTML to show key information"""
     # Extract text content (simplified)
-    text = re.sub(r'<style[^>]*>.*?</style>', '', html_content, flags=re.DOTALL)
-    text = re.sub(r'<[^>]+>', '', text)
-    text = re.sub(r'\n\s*\n', '\n', text)
+    text = STYLE_RE.sub('', html_content)
+    text = TAG_RE.sub('', text)
+    text = BLANK_LINES_RE.sub('\n', text)
     return text.strip()
 
 def view_email(eml_path):
@@ -34,19 +39,15 @@ def view_email(eml_path):
     print(f"Subject: {msg['Subject']}")
     print("-"*70)
 
-    # Get attachments
-    attachments = []
-    html_body = None
-
-    for part in msg.walk():
-        content_disposition = str(part.get("Content-Disposition"))
+    # Get attachment names from headers only; their payloads are never decoded
+    attachments = [part.get_filename() for part in msg.iter_attachments() if part.get_filename()]
 
-        if "attachment" in content_disposition:
-            filename = part.get_filename()
-            if filename:
-                attachments.append(filename)
-        elif part.get_content_type() == "text/html":
-            html_body = part.get_content()
+    # Get the HTML body
+    html_body = next(
+        (part.get_content() for part in typed_subpart_iterator(msg, 'text', 'html')
+         if part.get_content_disposition() != 'attachment'),
+        None
+    )
 
     if attachments:
         print(f"Attachments: {', '.join(attachments)}")